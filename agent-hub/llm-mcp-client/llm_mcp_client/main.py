@@ -1,165 +1,504 @@
 import os
-import json
-import requests
-from typing import List, Dict, Any
+import time
+import asyncio
+import hashlib
+import httpx
+import msgspec
+import orjson
+from typing import List, Dict, Any, Optional, Protocol, Tuple
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, AsyncStream
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from mofa.agent_build.base.base_agent import MofaAgent, run_agent
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
-class SyncMCPClient:
-    """同步 MCP 客户端"""
+# 已格式化的工具定义缓存: base_url -> (获取时间, 原始工具列表的摘要, tool_defs)
+_TOOLS_CACHE: Dict[str, Tuple[float, str, List[Dict[str, Any]]]] = {}
+
+# 启用 MCP_BATCH_EXECUTE 后，MCP 服务器是否支持 /batch_execute: base_url -> bool，首次批量调用时探测
+_BATCH_SUPPORT: Dict[str, bool] = {}
+
+
+class MCPTool(msgspec.Struct):
+    """MCP 工具定义，description 和 inputSchema 的类型在格式化时再检查"""
+    name: Optional[str] = None
+    description: Any = ""
+    inputSchema: Any = None
+
+
+_TOOL_DECODER = msgspec.json.Decoder(MCPTool)
+
+
+def decode_tools(raw: bytes) -> List[MCPTool]:
+    """解析工具列表的原始 JSON，逐个解析工具，跳过无法解析的条目"""
+    try:
+        entries = msgspec.json.decode(raw, type=List[msgspec.Raw])
+    except msgspec.DecodeError as e:
+        print(f"解析工具列表失败: {e}")
+        return []
+
+    tools = []
+    for entry in entries:
+        try:
+            tools.append(_TOOL_DECODER.decode(entry))
+        except msgspec.DecodeError as e:
+            print(f"跳过无法解析的工具: {e}")
+    return tools
+
+
+def _encode_call(tool_name: str, raw_args: str) -> bytes:
+    """编码单个工具调用，参数 JSON 原样拼接"""
+    return b'{"name":%s,"arguments":%s}' % (orjson.dumps(tool_name), raw_args.encode())
+
+
+def _encode_batch(calls: List[Tuple[str, str]]) -> bytes:
+    """编码 /batch_execute 请求体"""
+    return b'{"batch":[%s]}' % b",".join(
+        _encode_call(tool_name, raw_args) for tool_name, raw_args in calls
+    )
+
+
+class MCPClient:
+    """MCP 客户端，基于 httpx 异步连接池，多次执行之间复用"""
 
     def __init__(self, base_url: str = None):
         if base_url is None:
             base_url = os.getenv('MCP_BASE_URL', 'http://127.0.0.1:9000/mcp/')
         self.base_url = base_url.rstrip('/')
-        self.session = requests.Session()
+        # 只有服务器实现了 /batch_execute 时才设置，默认逐个并发调用
+        self.batch_execute = os.getenv('MCP_BATCH_EXECUTE') == "true"
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('MCP_MAX_CONN', 500)),
+                max_keepalive_connections=int(os.getenv('MCP_MAX_KEEPALIVE', 100)),
+                keepalive_expiry=30.0
+            ),
+            timeout=httpx.Timeout(float(os.getenv('MCP_TIMEOUT', 30)))
+        )
 
-    def list_tools(self) -> List[Dict[str, Any]]:
-        """获取工具列表"""
+    async def list_tools_raw(self) -> Optional[bytes]:
+        """获取工具列表的原始 JSON，失败时返回 None"""
         try:
-            response = self.session.get(f"{self.base_url}/tools")
+            response = await self._client.get(f"{self.base_url}/tools")
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return response.content
+        except httpx.HTTPError as e:
             print(f"获取工具列表失败: {e}")
-            return []
+            return None
+
+    async def call_tool_raw(self, tool_name: str, raw_args: str) -> Dict[str, Any]:
+        """调用工具，参数为 JSON 字符串，原样转发而不解析"""
+        return await self._post_call_tool(tool_name, _encode_call(tool_name, raw_args))
+
+    async def call_tools_batch(self, calls: List[Tuple[str, str]]) -> List[Any]:
+        """批量调用工具，calls 为 (工具名, JSON 参数字符串)；未启用 MCP_BATCH_EXECUTE 或服务器不支持 /batch_execute 时并发逐个调用"""
+        if self.batch_execute and len(calls) > 1 and _BATCH_SUPPORT.get(self.base_url, True):
+            try:
+                response = await self._client.post(
+                    f"{self.base_url}/batch_execute",
+                    content=_encode_batch(calls),
+                    headers=_JSON_HEADERS
+                )
+            except httpx.HTTPError as e:
+                print(f"批量调用工具失败: {e}")
+                return [{"error": str(e)} for _ in calls]
+
+            status = response.status_code
+            if status in (404, 405, 501):
+                # 服务器没有实现 /batch_execute，之后不再尝试
+                print(f"MCP 服务器不支持 /batch_execute ({status})，改为逐个调用")
+                _BATCH_SUPPORT[self.base_url] = False
+            elif status == 429:
+                # 服务器正在限流，不再逐个发送请求加重负担
+                return self._batch_results(response, len(calls))
+            elif 400 <= status < 500:
+                # 其他 4xx 时服务器没有执行任何调用，仅本次改为逐个调用
+                print(f"批量调用被拒绝 ({status})，本次改为逐个调用")
+            else:
+                return self._batch_results(response, len(calls))
+
+        # 单个调用出错时不影响其他调用的结果
+        results = await asyncio.gather(
+            *[self.call_tool_raw(tool_name, raw_args) for tool_name, raw_args in calls],
+            return_exceptions=True
+        )
+        return [{"error": str(result)} if isinstance(result, Exception) else result for result in results]
 
-    def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        """调用工具"""
+    def _batch_results(self, response: httpx.Response, count: int) -> List[Any]:
+        """解析 /batch_execute 的响应，服务器可能已执行调用，出错时不再回退"""
         try:
-            payload = {
-                "name": tool_name,
-                "arguments": args
-            }
-            response = self.session.post(f"{self.base_url}/call_tool", json=payload)
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
+            results = result.get("results") if isinstance(result, dict) else result
+            if not isinstance(results, list) or len(results) != count:
+                raise ValueError(f"批量调用返回的结果数量与调用数量 {count} 不一致")
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"批量调用工具失败: {e}")
+            return [{"error": str(e)} for _ in range(count)]
+
+        _BATCH_SUPPORT[self.base_url] = True
+        return [item.get("data", {}) if isinstance(item, dict) else item for item in results]
+
+    async def _post_call_tool(self, tool_name: str, body: bytes) -> Dict[str, Any]:
+        """发送已编码的工具调用请求"""
+        try:
+            response = await self._client.post(
+                f"{self.base_url}/call_tool",
+                content=body,
+                headers=_JSON_HEADERS
+            )
+            response.raise_for_status()
+            result = orjson.loads(response.content)
             return result.get("data", {}) if isinstance(result, dict) else result
-        except requests.RequestException as e:
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
             print(f"调用工具 {tool_name} 失败: {e}")
             return {"error": str(e)}
 
-    def close(self):
-        """关闭会话"""
-        self.session.close()
+    async def aclose(self):
+        """关闭连接池"""
+        await self._client.aclose()
 
 
-def format_tools_for_llm(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """将 MCP 工具格式化为 LLM 可用的工具定义"""
-    tool_defs = []
+class CacheBackend(Protocol):
+    """LLM 回复缓存的存储后端"""
 
-    for tool in tools:
-        tool_name = tool.get('name')
-        if not tool_name:
-            continue
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
 
-        tool_description = tool.get('description', "")
-        if not isinstance(tool_description, str):
-            tool_description = str(tool_description)
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
 
-        tool_parameters = tool.get('inputSchema')
-        if not tool_parameters:
-            tool_parameters = {"type": "object", "properties": {}}
-        elif isinstance(tool_parameters, str):
-            try:
-                tool_parameters = json.loads(tool_parameters)
-            except json.JSONDecodeError:
-                continue
-        elif not isinstance(tool_parameters, dict):
-            continue
 
-        # 确保 tool_parameters 包含 'type' 和 'properties' 键
-        tool_parameters.setdefault("type", "object")
-        tool_parameters.setdefault("properties", {})
+class MemoryCacheBackend:
+    """进程内缓存后端"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+
+
+class RedisCacheBackend:
+    """Redis 缓存后端，需要安装 redis"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._redis.set(key, value, ex=max(1, int(ttl)))
+
+
+class LLMCache:
+    """LLM 回复缓存，只缓存不涉及工具调用的直接回复"""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(model_name: str, messages: List[Dict[str, Any]],
+                 tool_defs: List[Dict[str, Any]]) -> str:
+        """根据模型、对话历史和可用工具生成缓存键"""
+        tool_names = sorted(tool_def["function"]["name"] for tool_def in tool_defs)
+        raw = orjson.dumps(
+            {"model": model_name, "messages": messages, "tools": tool_names},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return "llm:" + hashlib.sha256(raw).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"读取 LLM 缓存失败: {e}")
+            return None
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, content: str) -> None:
+        try:
+            await self.backend.set(key, content.encode(), self.ttl)
+        except Exception as e:
+            print(f"写入 LLM 缓存失败: {e}")
+
+
+_llm_cache = None
+
 
-        tool_defs.append({
+def _get_llm_cache() -> Optional[LLMCache]:
+    """按环境变量创建 LLM 回复缓存，LLM_CACHE_TTL 未设置或为 0 时不启用"""
+    global _llm_cache
+    ttl = float(os.getenv('LLM_CACHE_TTL', 0))
+    if ttl <= 0:
+        return None
+    if _llm_cache is None:
+        redis_url = os.getenv('LLM_CACHE_REDIS_URL')
+        backend = RedisCacheBackend(redis_url) if redis_url else MemoryCacheBackend()
+        _llm_cache = LLMCache(backend, ttl)
+    return _llm_cache
+
+
+def _tool_parameters(tool: MCPTool) -> Optional[Dict[str, Any]]:
+    """解析工具的 inputSchema，无法解析时返回 None"""
+    parameters = tool.inputSchema
+    if not parameters:
+        return {"type": "object", "properties": {}}
+    if isinstance(parameters, str):
+        try:
+            parameters = msgspec.json.decode(parameters, type=Dict[str, Any])
+        except msgspec.DecodeError:
+            return None
+    elif not isinstance(parameters, dict):
+        return None
+
+    # 确保 parameters 包含 'type' 和 'properties' 键
+    parameters.setdefault("type", "object")
+    parameters.setdefault("properties", {})
+    return parameters
+
+
+def _tool_description(tool: MCPTool) -> str:
+    """工具描述，非字符串时转换为字符串"""
+    description = tool.description or ""
+    return description if isinstance(description, str) else str(description)
+
+
+def format_tools_for_llm(tools: List[MCPTool]) -> List[Dict[str, Any]]:
+    """将 MCP 工具格式化为 LLM 可用的工具定义"""
+    return [
+        {
             "type": "function",
             "function": {
-                "name": tool_name,
-                "description": tool_description,
-                "parameters": tool_parameters,
+                "name": tool.name,
+                "description": _tool_description(tool),
+                "parameters": parameters,
             }
-        })
+        }
+        for tool in tools
+        if tool.name and (parameters := _tool_parameters(tool)) is not None
+    ]
+
+
+async def _get_tool_defs(mcp_client: MCPClient) -> List[Dict[str, Any]]:
+    """获取 LLM 可用的工具定义，在 MCP_TOOLS_TTL 秒内复用缓存结果"""
+    ttl = float(os.getenv('MCP_TOOLS_TTL', 300))
+    cached = _TOOLS_CACHE.get(mcp_client.base_url)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[2]
+
+    raw = await mcp_client.list_tools_raw()
+    if raw is None:
+        return []
+
+    # 工具列表未变化时直接复用已格式化的 tool_defs 对象
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    if cached is not None and cached[1] == digest:
+        tool_defs = cached[2]
+    else:
+        tool_defs = format_tools_for_llm(decode_tools(raw))
 
+    # 获取失败时返回空列表，不写入缓存，下次重新获取
+    if tool_defs:
+        _TOOLS_CACHE[mcp_client.base_url] = (time.monotonic(), digest, tool_defs)
     return tool_defs
 
 
-def chat_with_tools(user_query: str, mcp_client: SyncMCPClient,
-                    tool_defs: List[Dict[str, Any]],
-                    messages: List[Dict[str, Any]],
-                    planner_llm: OpenAI,
-                    model_name: str) -> str:
-    """处理单次对话，可能涉及工具调用"""
+class _MessageBuffer:
+    """增量序列化的对话历史，每条消息只编码一次"""
+
+    def __init__(self, messages: List[Dict[str, Any]]):
+        self._buf = bytearray()
+        self.extend(messages)
+
+    def append(self, message: Dict[str, Any]):
+        if self._buf:
+            self._buf += b","
+        self._buf += orjson.dumps(message)
+
+    def extend(self, messages: List[Dict[str, Any]]):
+        for message in messages:
+            self.append(message)
+
+    def request_body(self, **params) -> bytes:
+        """拼接 /chat/completions 请求体，messages 直接使用已编码的字节"""
+        head = orjson.dumps(params)[:-1] + b"," if params else b"{"
+        return head + b'"messages":[' + bytes(self._buf) + b"]}"
+
+
+async def _create_completion(planner_llm: AsyncOpenAI, body: bytes, stream: bool = False):
+    """发送已编码的 /chat/completions 请求，跳过 SDK 对参数的逐项转换和校验"""
+    if stream:
+        return await planner_llm.post(
+            "/chat/completions",
+            cast_to=ChatCompletion,
+            content=body,
+            stream=True,
+            stream_cls=AsyncStream[ChatCompletionChunk]
+        )
+    return await planner_llm.post("/chat/completions", cast_to=ChatCompletion, content=body)
+
+
+def _assistant_message(llm_message) -> Dict[str, Any]:
+    """将 LLM 返回的消息转换为普通 dict，后续请求无需再经过 SDK 的模型校验"""
+    message = {"role": "assistant", "content": llm_message.content}
+    if llm_message.tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": tool_call.id,
+                "type": "function",
+                "function": {
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments
+                }
+            }
+            for tool_call in llm_message.tool_calls
+        ]
+    return message
+
+
+async def chat_with_tools(user_query: str, mcp_client: MCPClient,
+                          tool_defs: List[Dict[str, Any]],
+                          messages: List[Dict[str, Any]],
+                          planner_llm: AsyncOpenAI,
+                          model_name: str,
+                          llm_cache: Optional[LLMCache] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """处理单次对话，可能涉及工具调用，返回回复内容和本轮新增的消息（失败时为空列表）"""
+
+    delta = [{"role": "user", "content": user_query}]
+
+    cache_key = None
+    if llm_cache is not None:
+        cache_key = llm_cache.make_key(model_name, messages + delta, tool_defs)
+        cached_content = await llm_cache.get(cache_key)
+        if cached_content is not None:
+            delta.append({"role": "assistant", "content": cached_content})
+            return cached_content, delta
 
-    messages.append({"role": "user", "content": user_query})
+    history = _MessageBuffer(messages)
+    history.extend(delta)
 
     try:
         if tool_defs:
-            plan_resp = planner_llm.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                tools=tool_defs,
-                tool_choice="auto"
-            )
+            body = history.request_body(model=model_name, tools=tool_defs, tool_choice="auto")
         else:
-            plan_resp = planner_llm.chat.completions.create(
-                model=model_name,
-                messages=messages
-            )
+            body = history.request_body(model=model_name)
+        plan_resp = await _create_completion(planner_llm, body)
     except Exception as e:
-        messages.pop()  # 移除最后一条用户消息
-        return f"错误：LLM 调用失败: {e}"
+        return f"错误：LLM 调用失败: {e}", []
 
     llm_message = plan_resp.choices[0].message
-    messages.append(llm_message)
+    assistant_message = _assistant_message(llm_message)
+    delta.append(assistant_message)
 
     if llm_message.tool_calls:
-        # LLM 决定调用工具
+        # LLM 决定调用工具，先校验全部参数
+        calls = []
         for func_call in llm_message.tool_calls:
-            tool_name = func_call.function.name
+            raw_args = func_call.function.arguments or "{}"
             try:
-                args = json.loads(func_call.function.arguments)
-                tool_result = mcp_client.call_tool(tool_name, args)
-
-                # 将工具调用结果添加到对话历史
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": func_call.id,
-                    "name": tool_name,
-                    "content": json.dumps(tool_result, ensure_ascii=False)
-                })
-
-            except json.JSONDecodeError as e:
-                messages.pop()  # 移除用户消息
-                messages.pop()  # 移除 LLM 的工具调用
-                return f"错误：解析工具参数失败: {e}"
-            except Exception as e:
-                messages.pop()  # 移除用户消息
-                messages.pop()  # 移除 LLM 的工具调用
-                return f"错误：工具 {tool_name} 调用失败: {e}"
+                orjson.loads(raw_args)
+            except orjson.JSONDecodeError as e:
+                return f"错误：解析工具参数失败: {e}", []
+            calls.append((func_call.function.name, raw_args))
+
+        # 所有工具调用合并为一次批量请求
+        try:
+            tool_results = await mcp_client.call_tools_batch(calls)
+        except Exception as e:
+            return f"错误：工具调用失败: {e}", []
+
+        # 按原始顺序将工具调用结果添加到对话历史，保证 tool_call_id 与调用一一对应
+        tool_messages = [
+            {
+                "role": "tool",
+                "tool_call_id": func_call.id,
+                "name": func_call.function.name,
+                "content": orjson.dumps(tool_result).decode()
+            }
+            for func_call, tool_result in zip(llm_message.tool_calls, tool_results)
+        ]
+        delta.extend(tool_messages)
+
+        # 只编码本轮新增的消息，之前的历史直接复用
+        history.append(assistant_message)
+        history.extend(tool_messages)
 
         # 再次调用 LLM，让它根据工具结果给出最终回复
         try:
-            final_resp = planner_llm.chat.completions.create(
-                model=model_name,
-                messages=messages
+            final_stream = await _create_completion(
+                planner_llm,
+                history.request_body(model=model_name, stream=True),
+                stream=True
             )
 
-            final_content = final_resp.choices[0].message.content
-            messages.append({"role": "assistant", "content": final_content})
-            return final_content
+            # 逐块累积流式回复，首个 token 到达后即开始接收
+            final_content = "".join([
+                chunk.choices[0].delta.content or "" async for chunk in final_stream if chunk.choices
+            ])
+            delta.append({"role": "assistant", "content": final_content})
+            return final_content, delta
         except Exception as e:
-            return f"错误：生成最终回复失败: {e}"
+            return f"错误：生成最终回复失败: {e}", []
     else:
         # LLM 决定不调用工具，直接回复
-        return llm_message.content
+        if cache_key is not None and llm_message.content:
+            await llm_cache.set(cache_key, llm_message.content)
+        return llm_message.content, delta
+
+
+_event_loop = None
+
+
+def _run_async(coro):
+    """在常驻事件循环中运行协程，多次执行之间复用同一个循环及其上的连接"""
+    global _event_loop
+    if _event_loop is None:
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop.run_until_complete(coro)
+
+
+async def _run_query(user_query: str, mcp_client: MCPClient, planner_llm: AsyncOpenAI,
+                     model_name: str) -> Tuple[str, int]:
+    """获取工具并完成单次对话，返回回复内容和可用工具数"""
+
+    # 获取工具列表并构造 LLM 可用的 tool_def 列表
+    tool_defs = await _get_tool_defs(mcp_client)
+
+    # 对话历史，包括系统消息
+    messages = [{
+        "role": "system",
+        "content": "你是一个智能 agent，可以决定是否调用相关工具来完成任务。你会根据用户的问题进行回复或工具调用。"
+    }]
+    llm_cache = _get_llm_cache()
+
+    # 执行单次任务
+    # 单次执行模式，本轮新增的消息不再用于后续对话
+    response, _ = await chat_with_tools(user_query, mcp_client, tool_defs, messages,
+                                        planner_llm, model_name, llm_cache=llm_cache)
+    return response, len(tool_defs)
 
 
 @run_agent
-def run(agent: MofaAgent, planner_llm: OpenAI = None, model_name: str = None):
+def run(agent: MofaAgent, mcp_client: MCPClient = None, planner_llm: AsyncOpenAI = None,
+        model_name: str = None):
     """运行 MCP Agent - 单次执行模式"""
 
     # 获取用户输入
@@ -171,31 +510,15 @@ def run(agent: MofaAgent, planner_llm: OpenAI = None, model_name: str = None):
         )
         return
 
-    # MCP 客户端连接
-    mcp_client = SyncMCPClient()
-
     try:
-        # 获取工具列表
-        tools = mcp_client.list_tools()
-
-        # 构造 LLM 可用的 tool_def 列表
-        tool_defs = format_tools_for_llm(tools)
-
-        # 对话历史，包括系统消息
-        messages = [{
-            "role": "system",
-            "content": "你是一个智能 agent，可以决定是否调用相关工具来完成任务。你会根据用户的问题进行回复或工具调用。"
-        }]
-
-        # 执行单次任务
-        response = chat_with_tools(user_query, mcp_client, tool_defs, messages, planner_llm, model_name)
+        response, tools_available = _run_async(_run_query(user_query, mcp_client, planner_llm, model_name))
 
         agent.send_output(
             agent_output_name='llm-mcp-client-result',
             agent_result={
                 "query": user_query,
                 "response": response,
-                "tools_available": len(tool_defs)
+                "tools_available": tools_available
             }
         )
 
@@ -207,8 +530,6 @@ def run(agent: MofaAgent, planner_llm: OpenAI = None, model_name: str = None):
                 "error": str(e)
             }
         )
-    finally:
-        mcp_client.close()
 
 
 def main():
@@ -222,16 +543,20 @@ def main():
     # 获取模型名称
     model_name = os.getenv('LLM_MODEL_NAME', 'gpt-4o')
 
-    # 初始化 OpenAI 客户端
-    planner_llm = OpenAI()
+    # 初始化 OpenAI 客户端，其连接池绑定在常驻事件循环上，多次执行之间复用
+    planner_llm = AsyncOpenAI()
+
+    # MCP 客户端，连接池同样在多次执行之间复用
+    mcp_client = MCPClient()
 
     # 创建 agent 实例
     agent = MofaAgent(agent_name='mcp-chat-agent')
 
-    # 将 planner_llm 和 model_name 设置到 agent 上下文中
-
     # 运行 agent
-    run(agent=agent, planner_llm=planner_llm, model_name=model_name)
+    try:
+        run(agent=agent, mcp_client=mcp_client, planner_llm=planner_llm, model_name=model_name)
+    finally:
+        _run_async(mcp_client.aclose())
 
 
 if __name__ == "__main__":
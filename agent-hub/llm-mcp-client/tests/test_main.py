@@ -0,0 +1,58 @@
+import orjson
+
+from llm_mcp_client.main import _MessageBuffer, _encode_batch, _encode_call
+
+MESSAGES = [
+    {"role": "system", "content": "你是一个智能 agent"},
+    {"role": "user", "content": 'say "hi"\n'},
+]
+
+TOOL_DEFS = [{
+    "type": "function",
+    "function": {"name": "search", "description": "", "parameters": {"type": "object", "properties": {}}}
+}]
+
+
+def test_request_body_without_params():
+    assert orjson.loads(_MessageBuffer(MESSAGES).request_body()) == {"messages": MESSAGES}
+
+
+def test_request_body_with_tools():
+    body = _MessageBuffer(MESSAGES).request_body(model="gpt-4o", tools=TOOL_DEFS, tool_choice="auto")
+    assert orjson.loads(body) == {
+        "model": "gpt-4o",
+        "tools": TOOL_DEFS,
+        "tool_choice": "auto",
+        "messages": MESSAGES,
+    }
+
+
+def test_request_body_with_stream():
+    body = _MessageBuffer(MESSAGES).request_body(model="gpt-4o", stream=True)
+    assert orjson.loads(body) == {"model": "gpt-4o", "stream": True, "messages": MESSAGES}
+
+
+def test_request_body_after_append():
+    history = _MessageBuffer([])
+    assert orjson.loads(history.request_body(model="gpt-4o")) == {"model": "gpt-4o", "messages": []}
+
+    history.extend(MESSAGES)
+    history.append({"role": "assistant", "content": None})
+    assert orjson.loads(history.request_body(model="gpt-4o"))["messages"] == [
+        *MESSAGES, {"role": "assistant", "content": None}
+    ]
+
+
+def test_encode_call_escapes_name():
+    for name in ['say "hi"', "back\\slash", "新闻\n搜索"]:
+        assert orjson.loads(_encode_call(name, '{"q": "x"}')) == {"name": name, "arguments": {"q": "x"}}
+
+
+def test_encode_batch():
+    calls = [('a"b', '{"x": 1}'), ("c", "{}")]
+    assert orjson.loads(_encode_batch(calls)) == {
+        "batch": [
+            {"name": 'a"b', "arguments": {"x": 1}},
+            {"name": "c", "arguments": {}},
+        ]
+    }
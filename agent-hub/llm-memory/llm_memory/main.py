@@ -1,4 +1,10 @@
 import json
+import time
+import atexit
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from mofa.agent_build.base.base_agent import MofaAgent, run_agent
 import os
 from dotenv import load_dotenv
@@ -6,37 +12,137 @@ from mofa.kernel.base import MemoryAgent
 from openai import OpenAI
 from mofa.utils.files.read import read_yaml
 from mem0 import Memory
+
+# 在模块加载时读取配置，避免每次请求重复读取环境变量
+load_dotenv('.env')
+_MEM_LIMIT = int(os.getenv('MEMORY_LIMIT', '5'))
+_USER_ID = os.getenv('MEMORY_ID', 'mofa-memory-user')
+_MODEL = os.getenv('LLM_MODEL_NAME', 'gpt-4o')
+_BASE_URL = os.getenv('LLM_BASE_URL', 'https://api.openai.com/v1')
+_SYS = os.getenv('SYSTEM_PROMPT', 'You are a helpful assistant that helps people find information.')
+_MEM_CACHE_TTL = int(os.getenv('MEMORY_CACHE_TTL', '0'))
+_MEM_CACHE_REDIS_URL = os.getenv('MEMORY_CACHE_REDIS_URL')
+
+# 记忆写回在后台线程中执行，单线程保证写入顺序；退出前等待未完成的写入
+_MEM_EXEC = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-writer')
+atexit.register(_MEM_EXEC.shutdown, wait=True)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_openai(base_url: str) -> OpenAI:
+    """按 base_url 复用 OpenAI 客户端及其连接池"""
+    return OpenAI(api_key=os.environ['OPENAI_API_KEY'], base_url=base_url)
+
+
+# 未配置 Redis 时使用的进程内检索缓存: cache_key -> (过期时间, 检索结果)，按写入顺序淘汰
+_SEARCH_CACHE_MAX = 1024
+_search_cache = {}
+_redis_client = None
+
+
+def _get_redis():
+    """设置了 MEMORY_CACHE_REDIS_URL 时返回 Redis 客户端，未安装 redis 时改用进程内缓存"""
+    global _redis_client, _MEM_CACHE_REDIS_URL
+    if not _MEM_CACHE_REDIS_URL:
+        return None
+    if _redis_client is None:
+        try:
+            import redis
+        except ImportError:
+            print('redis is not installed, falling back to the in-process memory cache')
+            _MEM_CACHE_REDIS_URL = None
+            return None
+        _redis_client = redis.Redis.from_url(_MEM_CACHE_REDIS_URL)
+    return _redis_client
+
+
+def _log_write_error(future):
+    """后台写入失败时输出错误信息"""
+    if future.exception() is not None:
+        print(f'Error adding messages to memory: {future.exception()}')
+
+
+def search_memories(memory, query: str, user_id: str, limit: int):
+    """检索相关记忆，设置 MEMORY_CACHE_TTL 后相同用户的相同问题在该时间内复用检索结果
+
+    每次对话都会写入新记忆，缓存命中时不包含 TTL 内写入的记忆，因此默认不启用。
+    """
+    ttl = _MEM_CACHE_TTL
+    if ttl <= 0:
+        return memory.search(query=query, user_id=user_id, limit=limit)
+
+    digest = hashlib.blake2b(query.strip().lower().encode(), digest_size=16).hexdigest()
+    cache_key = f"mem:{user_id}:{limit}:{digest}"
+
+    cached = None
+    redis_client = None
+    try:
+        redis_client = _get_redis()
+        if redis_client is not None:
+            cached = redis_client.get(cache_key)
+        else:
+            entry = _search_cache.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                cached = entry[1]
+    except Exception as e:
+        print(f'Error reading memory cache: {e}')
+    if cached is not None:
+        return orjson.loads(cached)
+
+    relevant_memories = memory.search(query=query, user_id=user_id, limit=limit)
+
+    value = orjson.dumps(relevant_memories, default=str)
+    try:
+        if redis_client is not None:
+            redis_client.setex(cache_key, ttl, value)
+        else:
+            now = time.monotonic()
+            if len(_search_cache) >= _SEARCH_CACHE_MAX:
+                for key in [k for k, (expires_at, _) in _search_cache.items() if expires_at <= now]:
+                    del _search_cache[key]
+                # 仍然已满时淘汰最早写入的条目
+                while len(_search_cache) >= _SEARCH_CACHE_MAX:
+                    del _search_cache[next(iter(_search_cache))]
+            _search_cache.pop(cache_key, None)
+            _search_cache[cache_key] = (now + ttl, value)
+    except Exception as e:
+        print(f'Error writing memory cache: {e}')
+    return relevant_memories
+
+
 @run_agent
 def run(agent: MofaAgent,memory,messages:list=[]):
     query = agent.receive_parameter(parameter_name='query')
-    os.environ['OPENAI_API_KEY'] = os.getenv('LLM_API_KEY')
-
-    user_id = os.getenv('MEMORY_ID', 'mofa-memory-user')
 
-    relevant_memories = memory.search(query=query, user_id=user_id, limit=os.getenv('MEMORY_LIMIT', 5))
+    relevant_memories = search_memories(memory, query=query, user_id=_USER_ID, limit=_MEM_LIMIT)
     print('relevant_memories : ',relevant_memories)
-    base_url = os.getenv('LLM_BASE_URL', 'https://api.openai.com/v1')
 
-    client = OpenAI(api_key=os.environ['OPENAI_API_KEY'], base_url=base_url)
+    # 记忆以规范的 JSON 形式写入系统提示词，相同的记忆总是得到相同的提示词
+    mem_blob = orjson.dumps(relevant_memories, default=str).decode()
+    system_content = f'{_SYS}\n\nMemory Data:\n{mem_blob}'
+
+    client = _get_openai(_BASE_URL)
     response = client.chat.completions.create(
         # model="deepseek-chat",
-        model=os.getenv('LLM_MODEL_NAME', 'gpt-4o'),
+        model=_MODEL,
         messages=[
-            {"role": "system", "content": os.getenv('SYSTEM_PROMPT',
-                                                    'You are a helpful assistant that helps people find information.') + f'   Memory Data {relevant_memories}'},
+            {"role": "system", "content": system_content},
             {"role": "user", "content": f"user query: {query}  "},
         ],
-        stream=False
+        stream=True
     )
+    # 逐块累积流式回复，首个 token 到达后即开始接收
+    content = ''.join(chunk.choices[0].delta.content or '' for chunk in response if chunk.choices)
     messages.append({'role': 'user', 'content': query})
-    messages.append({'role': 'assistant', 'content': response.choices[0].message.content})
-    memory.add_messages(messages=messages, user_id=user_id)
-    agent.send_output(agent_output_name='llm-memory-result', agent_result=response.choices[0].message.content)
+    messages.append({'role': 'assistant', 'content': content})
+    # 复制消息列表，避免后台写入时列表被下一次请求修改
+    future = _MEM_EXEC.submit(memory.add_messages, messages=list(messages), user_id=_USER_ID)
+    future.add_done_callback(_log_write_error)
+    agent.send_output(agent_output_name='llm-memory-result', agent_result=content)
 
 
 def main():
     config_path = 'llm_config.yaml'
-    load_dotenv('.env')
     api_key = os.getenv('LLM_API_KEY')
     os.environ['OPENAI_API_KEY'] = api_key
 
@@ -1,12 +1,17 @@
 import os
-import json
 import asyncio
-from typing import List, Dict, Any
+import logging
+import threading
+import concurrent.futures
+from typing import List, Dict, Any, Tuple
 
+import orjson
 from dotenv import load_dotenv
 from fastmcp import Client
 from openai import OpenAI
 
+logger = logging.getLogger(__name__)
+
 
 class SyncMCPClient:
     """同步 MCP 客户端 - 基于 FastMCP 官方客户端"""
@@ -15,59 +20,84 @@ class SyncMCPClient:
         if base_url is None:
             base_url = os.getenv('MCP_BASE_URL', 'http://127.0.0.1:9000/mcp/')
         self.base_url = base_url
+        self.timeout = float(os.getenv('MCP_TIMEOUT', 60))
         print(f"🔗 FastMCP 服务器地址: {self.base_url}")
 
-    def _run_async(self, coro):
-        """运行异步函数的辅助方法"""
+        # 后台线程运行常驻事件循环，并保持一个已完成握手的会话供后续调用复用
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+        self._client = Client(self.base_url)
         try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            self._run_async(self._client.__aenter__(), timeout=self.timeout)
+        except Exception:
+            self._stop_loop()
+            raise
+
+    def _run_async(self, coro, timeout: float = None):
+        """在后台事件循环中运行协程并等待结果，超时后取消该协程"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
 
-        return loop.run_until_complete(coro)
+    def _stop_loop(self):
+        """停止后台事件循环并等待线程退出"""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
 
     async def _list_tools_async(self) -> List[Dict[str, Any]]:
         """异步获取工具列表"""
-        mcp_client = Client(self.base_url)
-
-        async with mcp_client:
-            tools = await mcp_client.list_tools()
-
-            # 将工具对象转换为字典
-            tool_list = []
-            for tool in tools:
-                tool_dict = {
-                    'name': getattr(tool, 'name', None),
-                    'description': getattr(tool, 'description', ''),
-                    'inputSchema': getattr(tool, 'inputSchema', {})
-                }
-                tool_list.append(tool_dict)
+        tools = await self._client.list_tools()
+
+        # 将工具对象转换为字典
+        tool_list = []
+        for tool in tools:
+            tool_dict = {
+                'name': getattr(tool, 'name', None),
+                'description': getattr(tool, 'description', ''),
+                'inputSchema': getattr(tool, 'inputSchema', {})
+            }
+            tool_list.append(tool_dict)
 
-            return tool_list
+        return tool_list
 
     async def _call_tool_async(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         """异步调用工具"""
-        mcp_client = Client(self.base_url)
+        try:
+            tool_result_obj = await self._client.call_tool(tool_name, args)
+            return tool_result_obj.data if tool_result_obj else {}
+        except Exception as e:
+            return {"error": str(e)}
 
-        async with mcp_client:
-            try:
-                tool_result_obj = await mcp_client.call_tool(tool_name, args)
-                return tool_result_obj.data if tool_result_obj else {}
-            except Exception as e:
-                return {"error": str(e)}
+    async def call_tools_async(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """在同一个会话内并发调用多个工具，结果顺序与 calls 一致"""
+        return await asyncio.gather(
+            *[self._call_tool_async(tool_name, args) for tool_name, args in calls]
+        )
 
     def list_tools(self) -> List[Dict[str, Any]]:
         """同步获取工具列表"""
-        return self._run_async(self._list_tools_async())
+        return self._run_async(self._list_tools_async(), timeout=self.timeout)
 
     def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         """同步调用工具"""
-        return self._run_async(self._call_tool_async(tool_name, args))
+        return self._run_async(self._call_tool_async(tool_name, args), timeout=self.timeout)
+
+    def call_tools(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """同步并发调用多个工具，结果顺序与 calls 一致"""
+        return self._run_async(self.call_tools_async(calls), timeout=self.timeout)
 
     def close(self):
-        """关闭会话（兼容性方法）"""
-        pass
+        """关闭会话并停止后台事件循环"""
+        try:
+            self._run_async(self._client.__aexit__(None, None, None), timeout=self.timeout)
+        finally:
+            self._stop_loop()
 
 
 def format_tools_for_llm(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -88,8 +118,8 @@ def format_tools_for_llm(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             tool_parameters = {"type": "object", "properties": {}}
         elif isinstance(tool_parameters, str):
             try:
-                tool_parameters = json.loads(tool_parameters)
-            except json.JSONDecodeError:
+                tool_parameters = orjson.loads(tool_parameters)
+            except orjson.JSONDecodeError:
                 continue
         elif not isinstance(tool_parameters, dict):
             continue
@@ -140,35 +170,43 @@ def chat_with_tools(user_query: str, mcp_client: SyncMCPClient,
     messages.append(llm_message)
 
     if llm_message.tool_calls:
-        print(f"\n🔧 LLM 决定调用 {len(llm_message.tool_calls)} 个工具")
+        logger.debug("🔧 LLM 决定调用 %d 个工具", len(llm_message.tool_calls))
 
-        # LLM 决定调用工具
+        # LLM 决定调用工具，先解析全部参数
+        calls = []
         for func_call in llm_message.tool_calls:
             tool_name = func_call.function.name
             try:
-                args = json.loads(func_call.function.arguments)
-                print(f"  - 调用工具: {tool_name}")
-                print(f"  - 参数: {args}")
+                args = orjson.loads(func_call.function.arguments)
+            except orjson.JSONDecodeError as e:
+                messages.pop()  # 移除 LLM 的工具调用
+                messages.pop()  # 移除用户消息
+                return f"错误：解析工具参数失败: {e}"
+            logger.debug("- 调用工具: %s", tool_name)
+            logger.debug("- 参数: %s", args)
+            calls.append((tool_name, args))
 
-                tool_result = mcp_client.call_tool(tool_name, args)
-                print(f"  - 结果: {tool_result}")
+        # 在同一个 MCP 会话内并发执行所有工具调用，LLM 请求不占用会话所在的事件循环
+        try:
+            tool_results = mcp_client.call_tools(calls)
 
-                # 将工具调用结果添加到对话历史
-                messages.append({
+            # 按原始顺序编码工具调用结果，FastMCP 的 data 可能是任意对象，非字符串键和无法编码的值按字符串处理
+            tool_messages = []
+            for func_call, tool_result in zip(llm_message.tool_calls, tool_results):
+                logger.debug("- 结果: %s", tool_result)
+                tool_messages.append({
                     "role": "tool",
                     "tool_call_id": func_call.id,
-                    "name": tool_name,
-                    "content": json.dumps(tool_result, ensure_ascii=False)
+                    "name": func_call.function.name,
+                    "content": orjson.dumps(tool_result, option=orjson.OPT_NON_STR_KEYS, default=str).decode()
                 })
+        except Exception as e:
+            messages.pop()  # 移除 LLM 的工具调用
+            messages.pop()  # 移除用户消息
+            return f"错误：工具调用失败: {e}"
 
-            except json.JSONDecodeError as e:
-                messages.pop()  # 移除用户消息
-                messages.pop()  # 移除 LLM 的工具调用
-                return f"错误：解析工具参数失败: {e}"
-            except Exception as e:
-                messages.pop()  # 移除用户消息
-                messages.pop()  # 移除 LLM 的工具调用
-                return f"错误：工具 {tool_name} 调用失败: {e}"
+        # 将工具调用结果添加到对话历史
+        messages.extend(tool_messages)
 
         # 再次调用 LLM，让它根据工具结果给出最终回复
         try:
@@ -191,7 +229,15 @@ def run_chat(user_query: str, planner_llm: OpenAI, model_name: str) -> Dict[str,
     """运行单次对话"""
 
     # MCP 客户端连接
-    mcp_client = SyncMCPClient()
+    try:
+        mcp_client = SyncMCPClient()
+    except Exception as e:
+        print(f"❌ 连接 MCP 服务器失败: {e}")
+        return {
+            "query": user_query,
+            "error": str(e),
+            "success": False
+        }
 
     try:
         # 获取工具列表